@@ -0,0 +1,52 @@
+"""Session-state inventory helpers shared by the appliance logging tools."""
+
+INVENTORY_KEY = "appliance_inventory"
+# The dedup index lives in invocation-scoped ``temp:`` state: a live session is
+# a single invocation, so it persists for the session, but ADK strips it from
+# event state deltas and never writes it to the session service.
+INDEX_KEY = "temp:appliance_index"
+
+# Upper bound on inventory entries kept in session state. Oldest entries are
+# dropped past this so very long sessions don't grow state without limit.
+MAX_INVENTORY_SIZE = 500
+
+_KEY_FIELDS = ("appliance_type", "make", "model", "location")
+
+
+def _inventory_key(entry: dict) -> str:
+    """Return the case-insensitive dedup key for an inventory entry."""
+    return "|".join(str(entry.get(field, "")).strip().lower() for field in _KEY_FIELDS)
+
+
+def add_to_inventory(state, entry: dict) -> tuple[list[dict], bool]:
+    """Append an entry to the session inventory unless it is already logged.
+
+    Alongside the inventory list, state holds ``temp:appliance_index``: a dict
+    of dedup key to list position, so duplicate checks are a single lookup.
+    The index is rebuilt from the list if missing (e.g. a resumed session).
+
+    Args:
+        state: The session state mapping (``tool_context.state``).
+        entry: The appliance entry to add.
+
+    Returns:
+        The inventory list and whether the entry was added (False if duplicate).
+    """
+    inventory = state.get(INVENTORY_KEY, [])
+    index = state.get(INDEX_KEY)
+    if index is None:
+        index = {_inventory_key(e): i for i, e in enumerate(inventory)}
+
+    key = _inventory_key(entry)
+    if key in index:
+        return inventory, False
+
+    inventory.append(entry)
+    index[key] = len(inventory) - 1
+    if len(inventory) > MAX_INVENTORY_SIZE:
+        del inventory[: len(inventory) - MAX_INVENTORY_SIZE]
+        index = {_inventory_key(e): i for i, e in enumerate(inventory)}
+
+    state[INVENTORY_KEY] = inventory
+    state[INDEX_KEY] = index
+    return inventory, True
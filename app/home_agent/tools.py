@@ -2,6 +2,8 @@
 
 from google.adk.tools.tool_context import ToolContext
 
+from .inventory import add_to_inventory
+
 
 def log_appliance(
     appliance_type: str,
@@ -24,8 +26,6 @@ def log_appliance(
         notes: Optional additional notes about the appliance.
         user_id: Optional user identifier (defaults to "default_user")
     """
-    inventory = tool_context.state.get("appliance_inventory", [])
-
     entry = {
         "appliance_type": appliance_type,
         "make": make,
@@ -35,8 +35,13 @@ def log_appliance(
         "notes": notes,
         "user_id": user_id
     }
-    inventory.append(entry)
-    tool_context.state["appliance_inventory"] = inventory
+    inventory, added = add_to_inventory(tool_context.state, entry)
+    if not added:
+        return {
+            "status": "duplicate",
+            "message": f"{make} {model} {appliance_type} in {location} is already in the inventory",
+            "total_appliances": len(inventory),
+        }
 
     return {
         "status": "success",
@@ -1,30 +1,131 @@
 """BigQuery-backed tool for logging home appliances."""
 
+import asyncio
+import logging
 import os
+import threading
 from datetime import datetime, timezone
 
 from google.cloud import bigquery
 from google.adk.tools.tool_context import ToolContext
 
-# Lazy-init singleton — created on first tool call, reused thereafter.
+from .inventory import add_to_inventory
+
+logger = logging.getLogger(__name__)
+
+# Lazy-init singleton — created on first insert, reused thereafter, along with
+# the fully-qualified table reference formatted from its project. Built on a
+# worker thread, so creation is guarded by a lock.
 _bq_client = None
+_table_ref = None
+_bq_client_lock = threading.Lock()
 
 
 def _get_bq_client() -> bigquery.Client:
-    """Return a cached BigQuery client (created once per process)."""
-    global _bq_client
-    if _bq_client is None:
-        _bq_client = bigquery.Client(
-            project=os.environ.get("GOOGLE_CLOUD_PROJECT", "hybrid-vertex")
-        )
+    """Return a cached BigQuery client (created once per process).
+
+    The constructor resolves Application Default Credentials (file I/O, and a
+    metadata-server probe on GCE/Cloud Run), so call this off the event loop.
+    """
+    global _bq_client, _table_ref
+    with _bq_client_lock:
+        if _bq_client is None:
+            client = bigquery.Client(
+                project=os.environ.get("GOOGLE_CLOUD_PROJECT", "hybrid-vertex")
+            )
+            _table_ref = f"{client.project}.appliances_v2.inventory"
+            _bq_client = client
     return _bq_client
 
 
-# Fully-qualified table reference
-_BQ_TABLE = "{project}.appliances_v2.inventory"
+# Background writer: rows queued by the tool are flushed in batches of up to
+# _BATCH_MAX_ROWS, or after _BATCH_MAX_WAIT_SECONDS, whichever comes first.
+_BATCH_MAX_ROWS = 50
+_BATCH_MAX_WAIT_SECONDS = 0.5
+
+_row_queue: asyncio.Queue | None = None
+_writer_task: asyncio.Task | None = None
 
 
-def log_appliance_bq(
+def _insert_rows_sync(rows: list[dict]) -> list:
+    """Insert rows into BigQuery, creating the client if needed (blocking)."""
+    client = _get_bq_client()
+    return client.insert_rows_json(_table_ref, rows)
+
+
+async def _insert_rows(rows: list[dict]) -> list:
+    """Insert rows into BigQuery on a worker thread; return any row errors."""
+    return await asyncio.to_thread(_insert_rows_sync, rows)
+
+
+async def _run_bq_writer(queue: asyncio.Queue) -> None:
+    """Drain queued rows into BigQuery until a ``None`` sentinel is received."""
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        row = await queue.get()
+        if row is None:
+            break
+        batch = [row]
+        deadline = loop.time() + _BATCH_MAX_WAIT_SECONDS
+        while len(batch) < _BATCH_MAX_ROWS:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                row = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if row is None:
+                stopping = True
+                break
+            batch.append(row)
+
+        try:
+            errors = await _insert_rows(batch)
+        except Exception:
+            logger.exception("BigQuery batch insert of %d rows failed", len(batch))
+            continue
+        if errors:
+            logger.error("BigQuery batch insert returned errors: %s", errors)
+
+
+def _on_bq_writer_done(task: asyncio.Task) -> None:
+    """Detach a writer that died unexpectedly so the tool inserts directly."""
+    global _row_queue, _writer_task
+    if task is not _writer_task or task.cancelled() or task.exception() is None:
+        return
+    logger.error(
+        "BigQuery background writer failed; %d queued rows lost, "
+        "falling back to direct inserts",
+        _row_queue.qsize(),
+        exc_info=task.exception(),
+    )
+    _row_queue = None
+    _writer_task = None
+
+
+def start_bq_writer() -> None:
+    """Start the background BigQuery writer on the running event loop."""
+    global _row_queue, _writer_task
+    if _writer_task is None:
+        _row_queue = asyncio.Queue()
+        _writer_task = asyncio.create_task(_run_bq_writer(_row_queue))
+        _writer_task.add_done_callback(_on_bq_writer_done)
+
+
+async def stop_bq_writer() -> None:
+    """Flush any queued rows and stop the background BigQuery writer."""
+    global _row_queue, _writer_task
+    if _writer_task is None:
+        return
+    _row_queue.put_nowait(None)
+    await _writer_task
+    _row_queue = None
+    _writer_task = None
+
+
+async def log_appliance_bq(
     appliance_type: str,
     make: str,
     model: str,
@@ -53,7 +154,6 @@ def log_appliance_bq(
     now = datetime.now(timezone.utc)
 
     # --- 1. Write to session state (always, even if BQ fails) ---
-    inventory = tool_context.state.get("appliance_inventory", [])
     entry = {
         "appliance_type": appliance_type,
         "make": make,
@@ -63,8 +163,13 @@ def log_appliance_bq(
         "notes": notes,
         "user_id": user_id,
     }
-    inventory.append(entry)
-    tool_context.state["appliance_inventory"] = inventory
+    inventory, added = add_to_inventory(tool_context.state, entry)
+    if not added:
+        return {
+            "status": "duplicate",
+            "message": f"{make} {model} {appliance_type} in {location} is already in the inventory",
+            "total_appliances": len(inventory),
+        }
 
     # --- 2. Write to BigQuery ---
     row = {
@@ -72,10 +177,13 @@ def log_appliance_bq(
         "timestamp": now.isoformat(),
     }
 
-    client = _get_bq_client()
-    project = client.project
-    table_ref = _BQ_TABLE.format(project=project)
-    errors = client.insert_rows_json(table_ref, [row])
+    if _row_queue is not None:
+        # The background writer batches the insert; errors are logged there.
+        _row_queue.put_nowait(row)
+        errors = []
+    else:
+        # No writer running (e.g. `adk web` or tests) — insert directly.
+        errors = await _insert_rows([row])
 
     if errors:
         return {
@@ -2,18 +2,19 @@
 """FastAPI application for ADK bidi-streaming with WebSocket."""
 
 import asyncio
-import base64
-import json
 import logging
 import os
+import struct
 import sys
 import warnings
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 # Add the app directory to sys.path so that home_agent can be imported
 # as a top-level package (matches the bidi-demo reference pattern).
 sys.path.insert(0, str(Path(__file__).parent))
 
+import orjson
 from dotenv import load_dotenv
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.responses import FileResponse
@@ -30,10 +31,11 @@ load_dotenv(Path(__file__).parent / ".env")
 # Import agent after loading environment variables
 # pylint: disable=wrong-import-position
 from home_agent.agent import agent  # noqa: E402
+from home_agent.tools_bq import start_bq_writer, stop_bq_writer
 
-# Configure logging
+# Configure logging (LOG_LEVEL=DEBUG for verbose ADK / Live API output)
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
 )
 logger = logging.getLogger(__name__)
@@ -43,10 +45,145 @@ warnings.filterwarnings("ignore", category=UserWarning, module="pydantic")
 
 APP_NAME = os.getenv("APP_NAME", "home-appliance-detector")
 
+# Binary client frames start with a one-byte tag identifying the payload, so
+# images travel as raw JPEG bytes instead of base64 inside JSON.
+FRAME_TAG_AUDIO = 0x01
+FRAME_TAG_IMAGE_JPEG = 0x02
+_MIME_BY_FRAME_TAG = {
+    FRAME_TAG_AUDIO: "audio/pcm;rate=16000",
+    FRAME_TAG_IMAGE_JPEG: "image/jpeg",
+}
+
+# Event fields the frontend consumes. Events that never set any of them are
+# dropped without reading the fields.
+_FORWARDED_EVENT_FIELDS = frozenset(
+    {
+        "content",
+        "turn_complete",
+        "interrupted",
+        "input_transcription",
+        "output_transcription",
+    }
+)
+
+# Maximum raw client frames buffered between the socket reader and decoder.
+INBOUND_QUEUE_MAXSIZE = 8
+
+# Pending requests in the LiveRequestQueue past which new mic audio chunks are
+# dropped (~50 chunks/sec), so a stalled model connection can't grow memory
+# without bound or replay stale audio once it recovers.
+LIVE_QUEUE_MAX_BACKLOG = 20
+
+# Maximum outbound frames buffered between event processing and socket writes.
+OUTBOUND_QUEUE_MAXSIZE = 64
+
+# Audio parts within one event are coalesced into a single binary frame, but
+# flushed early past this size so playback can start without waiting.
+AUDIO_FRAME_MAX_BYTES = 64 * 1024
+
+# Downstream binary frames are [u32 LE header length][event JSON][PCM audio].
+# The header is empty for pure audio; when an event carries audio and other
+# data, its JSON rides in the last audio frame instead of a separate text frame.
+_FRAME_HEADER_LEN = struct.Struct("<I")
+_EMPTY_HEADER_LEN = _FRAME_HEADER_LEN.pack(0)
+
+
+def _serialize_event(event, exclude=None) -> str:
+    """Serialize an ADK event to camelCase JSON.
+
+    None and default-valued fields (e.g. the empty ``actions`` deltas present
+    on every event) are omitted to keep text frames small.
+
+    ``exclude`` is a pydantic exclude mask, e.g. ``{"content": {"parts": {0}}}``
+    to drop individual parts without mutating the event.
+    """
+    return event.model_dump_json(
+        exclude=exclude, exclude_none=True, exclude_defaults=True, by_alias=True
+    )
+
+
+def _audio_frame(audio_chunks: list[bytes], header: bytes = b"") -> bytes:
+    """Build a downstream binary frame from PCM chunks and optional event JSON."""
+    prefix = _FRAME_HEADER_LEN.pack(len(header)) if header else _EMPTY_HEADER_LEN
+    return b"".join((prefix, header, *audio_chunks))
+
+
+def _audio_data(part: types.Part) -> bytes | None:
+    """Return the part's inline audio bytes, or None if it is not audio."""
+    inline_data = part.inline_data
+    if inline_data is None:
+        return None
+    mime_type = inline_data.mime_type
+    if mime_type is None or mime_type[:6] != "audio/":
+        return None
+    return inline_data.data
+
+
+class BoundedLiveRequestQueue(LiveRequestQueue):
+    """LiveRequestQueue that sheds realtime audio when the agent falls behind.
+
+    Audio chunks are dropped while ``max_backlog`` or more requests are
+    pending. Text, images and control requests are always queued.
+
+    The backlog is read from ``LiveRequestQueue._queue``, a private
+    ``asyncio.Queue`` present in google-adk 1.20.0 through 1.25.1; a test
+    fails if a future ADK release removes it.
+    """
+
+    def __init__(self, max_backlog: int = LIVE_QUEUE_MAX_BACKLOG):
+        super().__init__()
+        self._max_backlog = max_backlog
+        self._dropping = False
+        self.dropped_audio_chunks = 0
+
+    def send_realtime(self, blob: types.Blob):
+        if blob.mime_type[:6] == "audio/":
+            if self._queue.qsize() >= self._max_backlog:
+                if not self._dropping:
+                    self._dropping = True
+                    logger.warning("Agent is behind; dropping upstream audio chunks")
+                self.dropped_audio_chunks += 1
+                return
+            self._dropping = False
+        super().send_realtime(blob)
+
+
+def _handle_binary_frame(frame: bytes, live_request_queue: LiveRequestQueue) -> None:
+    """Forward a tagged binary client frame (audio or image) to the agent."""
+    mime_type = _MIME_BY_FRAME_TAG.get(frame[0]) if frame else None
+    if mime_type is None:
+        logger.warning("Dropping binary frame with unknown tag")
+        return
+    # Both fields are known-good (mime type from our own tag table, bytes
+    # from ASGI), so skip pydantic validation.
+    blob = types.Blob.model_construct(mime_type=mime_type, data=frame[1:])
+    live_request_queue.send_realtime(blob)
+
+
+def _handle_text_message(data: dict, live_request_queue: LiveRequestQueue) -> None:
+    """Forward a typed chat message to the agent."""
+    content = types.Content(parts=[types.Part(text=data["text"])])
+    live_request_queue.send_content(content)
+
+
+# JSON client messages, dispatched on their "type" field.
+_JSON_MESSAGE_HANDLERS = {
+    "text": _handle_text_message,
+}
+
 
 # --- Phase 1: Application Initialization (once at startup) ---
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the BigQuery background writer for the lifetime of the server."""
+    start_bq_writer()
+    yield
+    await stop_bq_writer()
+
+
+app = FastAPI(lifespan=lifespan)
 
 static_dir = Path(__file__).parent / "static"
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
@@ -55,6 +192,32 @@ session_service = InMemorySessionService()
 
 runner = Runner(app_name=APP_NAME, agent=agent, session_service=session_service)
 
+# agent.model may be a BaseLlm instance rather than a model name string.
+_AGENT_MODEL: str = agent.model if isinstance(agent.model, str) else ""
+_IS_NATIVE_AUDIO = "native-audio" in _AGENT_MODEL
+
+# Initial user turn sent on every connection to trigger the agent greeting.
+_GREETING = types.Content(
+    role="user",
+    parts=[types.Part(text="Hello, I just connected. Please greet me.")],
+)
+
+# RunConfig shared by every session. Only the session resumption handle varies
+# per connection, so sessions take a shallow model_copy() of this template
+# (ADK only reassigns top-level RunConfig fields, never mutates nested ones).
+_RUN_CONFIG_TEMPLATE = RunConfig(
+    streaming_mode=StreamingMode.BIDI,
+    response_modalities=["AUDIO"] if _IS_NATIVE_AUDIO else ["TEXT"],
+    speech_config=types.SpeechConfig(
+        voice_config=types.VoiceConfig(
+            prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name="Aoede")
+        )
+    ),
+    proactivity=types.ProactivityConfig(proactive_audio=True),
+    input_audio_transcription=types.AudioTranscriptionConfig(),
+    output_audio_transcription=types.AudioTranscriptionConfig(),
+)
+
 
 @app.get("/")
 async def root():
@@ -73,83 +236,103 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str, session_id: str
         app_name=APP_NAME, user_id=user_id, session_id=session_id
     )
 
-    live_request_queue = LiveRequestQueue()
+    live_request_queue = BoundedLiveRequestQueue()
 
-    is_native_audio = "native-audio" in (
-        agent.model if isinstance(agent.model, str) else ""
-    )
-    response_modalities = ["AUDIO"] if is_native_audio else ["TEXT"]
-
-    run_config = RunConfig(
-        streaming_mode=StreamingMode.BIDI,
-        response_modalities=response_modalities,
-        speech_config=types.SpeechConfig(
-            voice_config=types.VoiceConfig(
-                prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                    voice_name="Aoede"
-                )
+    run_config = _RUN_CONFIG_TEMPLATE.model_copy(
+        update={
+            "session_resumption": types.SessionResumptionConfig(
+                handle=session.state.get("session_resumption_handle")
             )
-        ),
-        proactivity=types.ProactivityConfig(proactive_audio=True),
-        input_audio_transcription=types.AudioTranscriptionConfig(),
-        output_audio_transcription=types.AudioTranscriptionConfig(),
-        session_resumption=types.SessionResumptionConfig(
-            handle=session.state.get("session_resumption_handle")
-        ),
+        }
     )
 
     # --- Phase 3: Concurrent upstream/downstream tasks ---
 
     # Send an initial message to trigger the agent greeting
-    live_request_queue.send_content(
-        types.Content(
-            role="user",
-            parts=[types.Part(text="Hello, I just connected. Please greet me.")],
-        )
-    )
+    live_request_queue.send_content(_GREETING)
 
-    async def upstream_task():
-        """Receive client messages and queue them for the agent."""
+    # Raw client frames handed from the socket reader to the decoder. Bounded
+    # so a slow decoder applies backpressure to the reader instead of
+    # buffering frames without limit.
+    inbound_queue: asyncio.Queue = asyncio.Queue(maxsize=INBOUND_QUEUE_MAXSIZE)
+
+    async def receive_task():
+        """Read raw client frames from the WebSocket into the inbound queue."""
         try:
             while True:
                 message = await websocket.receive()
-
-                if "bytes" in message:
-                    audio_blob = types.Blob(
-                        mime_type="audio/pcm;rate=16000",
-                        data=message["bytes"],
-                    )
-                    live_request_queue.send_realtime(audio_blob)
-
-                elif "text" in message:
-                    data = json.loads(message["text"])
-                    msg_type = data.get("type")
-
-                    if msg_type == "text":
-                        content = types.Content(
-                            parts=[types.Part(text=data["text"])]
-                        )
-                        live_request_queue.send_content(content)
-
-                    elif msg_type == "image":
-                        image_data = base64.b64decode(data["data"])
-                        image_blob = types.Blob(
-                            mime_type=data.get("mimeType", "image/jpeg"),
-                            data=image_data,
-                        )
-                        live_request_queue.send_realtime(image_blob)
-
+                if message["type"] == "websocket.disconnect":
+                    logger.info("Client disconnected (upstream): user=%s", user_id)
+                    # End the live session so run_live (and with it the other
+                    # tasks) finishes even if the model never sends again.
+                    live_request_queue.close()
+                    break
+                await inbound_queue.put(message)
         except WebSocketDisconnect:
             logger.info("Client disconnected (upstream): user=%s", user_id)
+            live_request_queue.close()
         except Exception as e:
             logger.exception("Upstream error: %s", e)
+        # Not in a finally: if the session is cancelled, upstream_task is
+        # cancelled too and a put on a full queue would never complete.
+        await inbound_queue.put(None)
+
+    async def upstream_task():
+        """Decode client frames and queue them for the agent."""
+        while True:
+            message = await inbound_queue.get()
+            if message is None:
+                break
+
+            try:
+                # One dict lookup per frame on the audio path; "text" is only
+                # looked up for the (rare) non-binary frames.
+                frame = message.get("bytes")
+                if frame is not None:
+                    _handle_binary_frame(frame, live_request_queue)
+                elif (text := message.get("text")) is not None:
+                    data = orjson.loads(text)
+                    handler = _JSON_MESSAGE_HANDLERS.get(data.get("type"))
+                    if handler is not None:
+                        handler(data, live_request_queue)
+
+            except Exception as e:
+                logger.exception("Failed to decode client message: %s", e)
+
+    # Frames handed from event processing to the socket writer: bytes are sent
+    # as binary frames, str as text. Bounded so a stalled socket eventually
+    # backpressures the agent stream instead of buffering without limit.
+    outbound_queue: asyncio.Queue = asyncio.Queue(maxsize=OUTBOUND_QUEUE_MAXSIZE)
+
+    async def send_task():
+        """Write queued frames to the WebSocket until a None sentinel."""
+        try:
+            while (frame := await outbound_queue.get()) is not None:
+                if type(frame) is bytes:
+                    await websocket.send_bytes(frame)
+                else:
+                    await websocket.send_text(frame)
+            return
+        except WebSocketDisconnect:
+            logger.info("Client disconnected (downstream): user=%s", user_id)
+        except Exception as e:
+            logger.exception("Downstream send error: %s", e)
+        # The socket is gone: end the live session and discard remaining
+        # frames so downstream_task never blocks on a full queue.
+        live_request_queue.close()
+        while await outbound_queue.get() is not None:
+            pass
 
     async def downstream_task():
-        """Stream agent events back to the client.
+        """Turn agent events into client frames on the outbound queue.
 
-        Audio data is sent as binary WebSocket frames for low-latency playback.
-        All other event data (transcriptions, turn_complete, etc.) is sent as JSON text.
+        Audio data is sent as binary WebSocket frames for low-latency playback,
+        with all audio parts of an event coalesced into one frame. Other event
+        data (transcriptions, turn_complete, etc.) is serialized as JSON and
+        fused into that frame's header, or sent as a text frame if the event
+        has no audio.
         """
+        put = outbound_queue.put
         try:
             async for event in runner.run_live(
                 session_id=session_id,
@@ -157,50 +340,85 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str, session_id: str
                 live_request_queue=live_request_queue,
                 run_config=run_config,
             ):
-                # Extract and send audio as binary frames
-                if event.content and event.content.parts:
-                    non_audio_parts = []
-                    for part in event.content.parts:
-                        if (
-                            part.inline_data
-                            and part.inline_data.mime_type
-                            and part.inline_data.mime_type.startswith("audio/")
-                        ):
-                            # Send raw audio bytes as binary WebSocket frame
-                            await websocket.send_bytes(part.inline_data.data)
-                        else:
-                            non_audio_parts.append(part)
-
-                    # Replace parts with non-audio parts only
-                    if non_audio_parts:
-                        event.content.parts = non_audio_parts
-                    else:
-                        event.content = None
-
-                # Only send JSON if the event has data the frontend needs:
-                # content with non-audio parts, transcriptions, turn signals, etc.
-                # Skip audio-only events that have no other useful fields.
-                has_useful_data = (
-                    event.content
-                    or event.turn_complete
+                # Skip events with nothing for the frontend (no content,
+                # transcription or turn signal) before any further work. The
+                # fields-set check rejects most such events in one set op;
+                # fields explicitly set to None/False are caught below.
+                if _FORWARDED_EVENT_FIELDS.isdisjoint(event.model_fields_set):
+                    continue
+                content = event.content
+                has_signal = bool(
+                    event.turn_complete
                     or event.interrupted
                     or event.input_transcription
                     or event.output_transcription
                 )
-                if has_useful_data:
-                    event_json = event.model_dump_json(
-                        exclude_none=True, by_alias=True
-                    )
-                    await websocket.send_text(event_json)
-        except WebSocketDisconnect:
-            logger.info("Client disconnected (downstream): user=%s", user_id)
+                if content is None and not has_signal:
+                    continue
+
+                # Extract audio and send it as binary frames, one per event.
+                # Audio parts are masked out of the JSON dump instead of being
+                # removed from the event, which avoids rebuilding the parts list.
+                has_content = content is not None
+                exclude = None
+                # Each frame is built with one b"".join, so chunks are copied
+                # once regardless of how many audio parts the event has.
+                audio_chunks = []
+                if has_content and content.parts:
+                    parts = content.parts
+                    audio_indices = set()
+                    audio_len = 0
+                    for i, part in enumerate(parts):
+                        chunk = _audio_data(part)
+                        if chunk is not None:
+                            audio_indices.add(i)
+                            audio_chunks.append(chunk)
+                            audio_len += len(chunk)
+                            if audio_len >= AUDIO_FRAME_MAX_BYTES:
+                                await put(_audio_frame(audio_chunks))
+                                audio_chunks.clear()
+                                audio_len = 0
+
+                    if len(audio_indices) == len(parts):
+                        has_content = False
+                        exclude = {"content"}
+                    elif audio_indices:
+                        exclude = {"content": {"parts": audio_indices}}
+
+                # Only serialize JSON if the event has data the frontend needs:
+                # content with non-audio parts, transcriptions, turn signals, etc.
+                # Skip audio-only events that have no other useful fields.
+                header = ""
+                if has_content or has_signal:
+                    header = _serialize_event(event, exclude=exclude)
+
+                if audio_chunks:
+                    await put(_audio_frame(audio_chunks, header.encode()))
+                elif header:
+                    await put(header)
         except Exception as e:
             logger.exception("Downstream error: %s", e)
+        # Not in a finally, for the same reason as in receive_task.
+        await outbound_queue.put(None)
 
     try:
-        await asyncio.gather(upstream_task(), downstream_task())
+        await asyncio.gather(
+            receive_task(), upstream_task(), downstream_task(), send_task()
+        )
     except Exception as e:
         logger.exception("Session error: %s", e)
     finally:
         live_request_queue.close()
+        # Release the session's state and event history; the in-memory
+        # service otherwise keeps every session for the life of the process.
+        await session_service.delete_session(
+            app_name=APP_NAME, user_id=user_id, session_id=session_id
+        )
+        if live_request_queue.dropped_audio_chunks:
+            logger.warning(
+                "Dropped %d upstream audio chunks: user=%s session=%s",
+                live_request_queue.dropped_audio_chunks,
+                user_id,
+                session_id,
+            )
         logger.info("Session closed: user=%s session=%s", user_id, session_id)
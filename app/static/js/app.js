@@ -15,6 +15,13 @@ let cameraInterval = null;
 let screenInterval = null;
 const CAMERA_FPS = 1;
 
+// Binary frames sent to the server start with a one-byte payload tag
+const FRAME_TAG_AUDIO = 0x01;
+const FRAME_TAG_IMAGE_JPEG = 0x02;
+
+// Decodes the event JSON header of binary frames received from the server
+const textDecoder = new TextDecoder();
+
 // --- DOM Elements ---
 const messagesEl = document.getElementById("messages");
 const textForm = document.getElementById("textForm");
@@ -80,9 +87,18 @@ function connect() {
     if (typeof event.data === "string") {
       // JSON text frame — event metadata (transcriptions, turn_complete, etc.)
       handleServerEvent(event.data);
-    } else if (audioContext) {
-      // Binary frame — raw PCM audio from Gemini
-      playAudioChunk(audioContext, event.data);
+    } else {
+      // Binary frame — [u32 LE header length][event JSON][raw PCM audio from Gemini]
+      const headerLen = new DataView(event.data).getUint32(0, true);
+      if (audioContext) {
+        // slice() copies the PCM to offset 0 so the Int16Array view is aligned
+        playAudioChunk(audioContext, event.data.slice(4 + headerLen));
+      }
+      if (headerLen > 0) {
+        handleServerEvent(
+          textDecoder.decode(new Uint8Array(event.data, 4, headerLen))
+        );
+      }
     }
   };
 }
@@ -269,7 +285,10 @@ async function toggleMicrophone() {
     try {
       [audioRecorderNode, micStream] = await startAudioRecorderWorklet(audioContext, (pcmData) => {
         if (ws && ws.readyState === WebSocket.OPEN) {
-          ws.send(pcmData.buffer);
+          const frame = new Uint8Array(pcmData.byteLength + 1);
+          frame[0] = FRAME_TAG_AUDIO;
+          frame.set(new Uint8Array(pcmData.buffer, pcmData.byteOffset, pcmData.byteLength), 1);
+          ws.send(frame.buffer);
         }
       });
       isMicActive = true;
@@ -344,15 +363,18 @@ function captureAndSendFrame() {
   const ctx = canvas.getContext("2d");
   ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
 
-  const dataUrl = canvas.toDataURL("image/jpeg", 0.7);
-  const base64Data = dataUrl.split(",")[1];
+  sendImageFrame(canvas);
+}
 
-  ws.send(
-    JSON.stringify({
-      type: "image",
-      mimeType: "image/jpeg",
-      data: base64Data,
-    })
+function sendImageFrame(canvas) {
+  // Raw JPEG bytes in a tagged binary frame — no base64 or JSON wrapping
+  canvas.toBlob(
+    (jpegBlob) => {
+      if (!jpegBlob || !ws || ws.readyState !== WebSocket.OPEN) return;
+      ws.send(new Blob([new Uint8Array([FRAME_TAG_IMAGE_JPEG]), jpegBlob]));
+    },
+    "image/jpeg",
+    0.7
   );
 }
 
@@ -422,16 +444,7 @@ function captureAndSendScreenFrame() {
   const ctx = canvas.getContext("2d");
   ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
 
-  const dataUrl = canvas.toDataURL("image/jpeg", 0.7);
-  const base64Data = dataUrl.split(",")[1];
-
-  ws.send(
-    JSON.stringify({
-      type: "image",
-      mimeType: "image/jpeg",
-      data: base64Data,
-    })
-  );
+  sendImageFrame(canvas);
 }
 
 // --- Debug Panel Toggle ---
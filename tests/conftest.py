@@ -1,7 +1,10 @@
 # tests/conftest.py
 """Shared test fixtures."""
 
+from types import SimpleNamespace
+
 import pytest
+from fastapi.testclient import TestClient
 
 
 @pytest.fixture
@@ -9,3 +12,45 @@ def app():
     """Import and return the FastAPI app."""
     from app.main import app
     return app
+
+
+@pytest.fixture
+def tool_context():
+    """Return a minimal stand-in ToolContext exposing only an empty ``state``."""
+    return SimpleNamespace(state={})
+
+
+@pytest.fixture(scope="module")
+def client():
+    """Return a TestClient for the FastAPI app, shared across a test module."""
+    from app.main import app
+    return TestClient(app)
+
+
+@pytest.fixture
+def stub_run_live(monkeypatch):
+    """Patch ``runner.run_live`` with a stub that yields the given events.
+
+    Like the real runner, the stub then keeps reading the LiveRequestQueue
+    until it receives the close request. Calling the fixture installs the stub
+    and returns a dict that records the run_live keyword arguments, plus
+    ``closed=True`` once the close request arrives.
+    """
+    from app.main import runner
+
+    def install(*events):
+        calls = {}
+
+        async def run_live(**kwargs):
+            calls.update(kwargs)
+            for event in events:
+                yield event
+            live_request_queue = kwargs["live_request_queue"]
+            while not (await live_request_queue.get()).close:
+                pass
+            calls["closed"] = True
+
+        monkeypatch.setattr(runner, "run_live", run_live)
+        return calls
+
+    return install
@@ -1,8 +1,8 @@
 # tests/test_main.py
 """Tests for the FastAPI WebSocket server."""
 
+import orjson
 import pytest
-from fastapi.testclient import TestClient
 
 
 class TestAppInitialization:
@@ -12,15 +12,13 @@ class TestAppInitialization:
         """FastAPI app can be imported."""
         assert app is not None
 
-    def test_root_serves_html(self, app):
+    def test_root_serves_html(self, client):
         """Root path serves the index.html file."""
-        client = TestClient(app)
         response = client.get("/")
         assert response.status_code == 200
 
-    def test_static_files_mounted(self, app):
+    def test_static_files_mounted(self, client):
         """Static files are accessible."""
-        client = TestClient(app)
         response = client.get("/static/css/style.css")
         # Will be 200 once static files exist, 404 is acceptable during scaffolding
         assert response.status_code in (200, 404)
@@ -29,33 +27,252 @@ class TestAppInitialization:
 class TestWebSocketEndpoint:
     """Verify WebSocket endpoint configuration."""
 
-    def test_websocket_endpoint_accepts_connection(self, app):
+    def test_websocket_endpoint_accepts_connection(self, client, stub_run_live):
         """WebSocket endpoint at /ws/{user_id}/{session_id} accepts connections."""
-        client = TestClient(app)
+        stub_run_live()
         with client.websocket_connect("/ws/test-user/test-session") as ws:
             # Connection should be accepted without error
             assert ws is not None
 
+    def test_run_config_copied_from_template(self, client, stub_run_live):
+        """Each session gets its own RunConfig copy with a resumption config."""
+        from google.adk.agents.run_config import StreamingMode
+
+        from app.main import _RUN_CONFIG_TEMPLATE
+
+        captured = stub_run_live()
+        with client.websocket_connect("/ws/test-user/config-session"):
+            pass
+
+        run_config = captured["run_config"]
+        assert run_config is not _RUN_CONFIG_TEMPLATE
+        assert run_config.streaming_mode == StreamingMode.BIDI
+        assert run_config.session_resumption is not None
+        assert _RUN_CONFIG_TEMPLATE.session_resumption is None
+
+    def test_session_deleted_on_disconnect(self, client, stub_run_live):
+        """The in-memory session is released when the WebSocket closes."""
+        import asyncio
+
+        from app.main import APP_NAME, session_service
+
+        captured = stub_run_live()
+        with client.websocket_connect("/ws/test-user/cleanup-session"):
+            pass
+
+        # The disconnect itself ended the live session, rather than the
+        # endpoint task being torn down with run_live still streaming.
+        assert captured.get("closed") is True
+        session = asyncio.run(
+            session_service.get_session(
+                app_name=APP_NAME, user_id="test-user", session_id="cleanup-session"
+            )
+        )
+        assert session is None
+
 
 class TestWebSocketMessageFormats:
     """Verify the server handles different message types."""
 
-    def test_text_message_format(self, app):
+    def test_text_message_format(self, client, stub_run_live):
         """Server accepts JSON text messages."""
-        import json
-        client = TestClient(app)
+        stub_run_live()
         with client.websocket_connect("/ws/test-user/text-session") as ws:
-            ws.send_text(json.dumps({"type": "text", "text": "Hello"}))
-
-    def test_image_message_format(self, app):
-        """Server accepts JSON image messages with base64 data."""
-        import json
-        import base64
-        client = TestClient(app)
-        fake_image = base64.b64encode(b"\xff\xd8\xff\xe0" + b"\x00" * 10).decode()
+            ws.send_text(orjson.dumps({"type": "text", "text": "Hello"}).decode())
+
+    def test_image_message_format(self, client, stub_run_live):
+        """Server accepts binary image frames tagged as JPEG."""
+        from app.main import FRAME_TAG_IMAGE_JPEG
+
+        stub_run_live()
+
+        fake_image = b"\xff\xd8\xff\xe0" + b"\x00" * 10
         with client.websocket_connect("/ws/test-user/image-session") as ws:
-            ws.send_text(json.dumps({
-                "type": "image",
-                "mimeType": "image/jpeg",
-                "data": fake_image,
-            }))
+            ws.send_bytes(bytes([FRAME_TAG_IMAGE_JPEG]) + fake_image)
+
+    def test_tagged_binary_frames_forwarded_as_blobs(self, client, stub_run_live):
+        """Tagged binary frames are forwarded to the agent with the right mime type."""
+        from unittest.mock import patch
+
+        from app.main import (
+            FRAME_TAG_AUDIO,
+            FRAME_TAG_IMAGE_JPEG,
+            BoundedLiveRequestQueue,
+        )
+
+        stub_run_live()
+        with (
+            patch.object(BoundedLiveRequestQueue, "send_realtime") as send_realtime,
+            client.websocket_connect("/ws/test-user/binary-session") as ws,
+        ):
+            ws.send_bytes(bytes([FRAME_TAG_AUDIO]) + b"\x00\x01")
+            ws.send_bytes(bytes([FRAME_TAG_IMAGE_JPEG]) + b"\xff\xd8\xff\xe0")
+
+        blobs = [call.args[0] for call in send_realtime.call_args_list]
+        assert [(b.mime_type, b.data) for b in blobs] == [
+            ("audio/pcm;rate=16000", b"\x00\x01"),
+            ("image/jpeg", b"\xff\xd8\xff\xe0"),
+        ]
+
+
+class TestBoundedLiveRequestQueue:
+    """Verify audio backpressure in BoundedLiveRequestQueue."""
+
+    def test_bounded_queue_drops_audio_past_backlog(self):
+        """Audio past the backlog limit is dropped; other requests still queue."""
+        from google.genai import types
+
+        from app.main import BoundedLiveRequestQueue
+
+        queue = BoundedLiveRequestQueue(max_backlog=3)
+        audio = types.Blob(mime_type="audio/pcm;rate=16000", data=b"\x00\x01")
+        for _ in range(5):
+            queue.send_realtime(audio)
+        assert queue._queue.qsize() == 3
+        assert queue.dropped_audio_chunks == 2
+
+        queue.send_realtime(types.Blob(mime_type="image/jpeg", data=b"\xff\xd8"))
+        queue.send_content(types.Content(parts=[types.Part(text="hi")]))
+        assert queue._queue.qsize() == 5
+
+    def test_bounded_queue_warns_on_each_stall(self, caplog):
+        """Each transition into dropping audio logs a warning."""
+        from google.genai import types
+
+        from app.main import BoundedLiveRequestQueue
+
+        queue = BoundedLiveRequestQueue(max_backlog=1)
+        audio = types.Blob(mime_type="audio/pcm;rate=16000", data=b"\x00\x01")
+        for _ in range(2):
+            queue.send_realtime(audio)  # queued
+            queue.send_realtime(audio)  # dropped
+            queue.send_realtime(audio)  # dropped, no new warning
+            queue._queue.get_nowait()  # agent catches up
+
+        warnings = [r for r in caplog.records if "dropping upstream audio" in r.message]
+        assert len(warnings) == 2
+        assert queue.dropped_audio_chunks == 4
+
+    def test_live_request_queue_exposes_private_queue(self):
+        """BoundedLiveRequestQueue relies on ADK's private _queue attribute."""
+        import asyncio
+
+        from google.adk.agents.live_request_queue import LiveRequestQueue
+
+        assert isinstance(LiveRequestQueue()._queue, asyncio.Queue)
+
+
+class TestDownstreamEvents:
+    """Verify how agent events are forwarded to the client."""
+
+    def test_serialize_event_drops_none_and_defaults(self):
+        """Events serialize to camelCase JSON without None or default fields."""
+        from google.adk.events import Event
+        from google.genai import types
+
+        from app.main import _serialize_event
+
+        event = Event(
+            author="home_appliance_detector",
+            output_transcription=types.Transcription(text="Hi there"),
+            turn_complete=True,
+        )
+
+        sent = orjson.loads(_serialize_event(event))
+        assert sent["outputTranscription"] == {"text": "Hi there"}
+        assert sent["turnComplete"] is True
+        assert "actions" not in sent
+        assert "content" not in sent
+
+    def test_audio_data(self):
+        """Only parts with an audio/* inline_data mime type yield audio bytes."""
+        from google.genai import types
+
+        from app.main import _audio_data
+
+        audio = types.Part(
+            inline_data=types.Blob(mime_type="audio/pcm;rate=24000", data=b"\x00")
+        )
+        image = types.Part(inline_data=types.Blob(mime_type="image/jpeg", data=b"\x00"))
+        no_mime = types.Part(inline_data=types.Blob(data=b"\x00"))
+        text = types.Part(text="hello")
+
+        assert _audio_data(audio) == b"\x00"
+        assert _audio_data(image) is None
+        assert _audio_data(no_mime) is None
+        assert _audio_data(text) is None
+
+    def test_audio_parts_coalesced_into_one_frame(self, client, stub_run_live):
+        """All audio parts of an event are sent as a single binary frame."""
+        from google.adk.events import Event
+        from google.genai import types
+
+        def audio(data):
+            return types.Part(
+                inline_data=types.Blob(mime_type="audio/pcm;rate=24000", data=data)
+            )
+
+        stub_run_live(
+            Event(
+                author="home_appliance_detector",
+                content=types.Content(
+                    role="model", parts=[audio(b"\x01\x02"), audio(b"\x03\x04")]
+                ),
+            ),
+            Event(author="home_appliance_detector", turn_complete=True),
+        )
+        with client.websocket_connect("/ws/test-user/audio-session") as ws:
+            assert ws.receive_bytes() == b"\x00\x00\x00\x00\x01\x02\x03\x04"
+            assert orjson.loads(ws.receive_text())["turnComplete"] is True
+
+    def test_audio_parts_excluded_from_json_without_mutating_event(
+        self, client, stub_run_live
+    ):
+        """Mixed events fuse audio with a JSON header of only non-audio parts."""
+        from google.adk.events import Event
+        from google.genai import types
+
+        event = Event(
+            author="home_appliance_detector",
+            content=types.Content(
+                role="model",
+                parts=[
+                    types.Part(
+                        inline_data=types.Blob(
+                            mime_type="audio/pcm;rate=24000", data=b"\x01\x02"
+                        )
+                    ),
+                    types.Part(text="I see a refrigerator"),
+                ],
+            ),
+        )
+
+        stub_run_live(event)
+        with client.websocket_connect("/ws/test-user/mixed-session") as ws:
+            frame = ws.receive_bytes()
+
+        header_len = int.from_bytes(frame[:4], "little")
+        assert frame[4 + header_len :] == b"\x01\x02"
+        sent = orjson.loads(frame[4 : 4 + header_len])
+        assert sent["content"]["parts"] == [{"text": "I see a refrigerator"}]
+        assert len(event.content.parts) == 2
+
+    def test_events_without_forwarded_fields_are_skipped(self, client, stub_run_live):
+        """Events with no content, transcription or turn signal are not sent."""
+        from google.adk.events import Event
+        from google.genai import types
+
+        stub_run_live(
+            Event(
+                author="home_appliance_detector",
+                usage_metadata=types.GenerateContentResponseUsageMetadata(
+                    total_token_count=42
+                ),
+            ),
+            Event(author="home_appliance_detector", turn_complete=True),
+        )
+        with client.websocket_connect("/ws/test-user/skip-session") as ws:
+            sent = orjson.loads(ws.receive_text())
+
+        assert sent["turnComplete"] is True
+        assert "usageMetadata" not in sent
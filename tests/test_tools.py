@@ -1,33 +1,28 @@
 # tests/test_tools.py
 """Tests for the home agent tools."""
 
-from unittest.mock import MagicMock
-
 import pytest
 
 
 class TestLogAppliance:
     """Tests for the log_appliance tool function."""
 
-    def test_log_appliance_adds_to_empty_inventory(self):
+    def test_log_appliance_adds_to_empty_inventory(self, tool_context):
         """First appliance creates the inventory list."""
         from app.home_agent.tools import log_appliance
 
-        mock_context = MagicMock()
-        mock_context.state = {}
-
         result = log_appliance(
             appliance_type="refrigerator",
             make="Samsung",
             model="RF28R7351SR",
             location="kitchen",
             finish="stainless steel",
-            tool_context=mock_context,
+            tool_context=tool_context,
         )
 
         assert result["status"] == "success"
-        assert len(mock_context.state["appliance_inventory"]) == 1
-        entry = mock_context.state["appliance_inventory"][0]
+        assert len(tool_context.state["appliance_inventory"]) == 1
+        entry = tool_context.state["appliance_inventory"][0]
         assert entry["appliance_type"] == "refrigerator"
         assert entry["make"] == "Samsung"
         assert entry["model"] == "RF28R7351SR"
@@ -35,13 +30,12 @@ class TestLogAppliance:
         assert entry["finish"] == "stainless steel"
         assert entry["user_id"] == "default_user"
 
-    def test_log_appliance_appends_to_existing_inventory(self):
+    def test_log_appliance_appends_to_existing_inventory(self, tool_context):
         """Subsequent appliances append to the list."""
         from app.home_agent.tools import log_appliance
 
-        mock_context = MagicMock()
         existing = [{"appliance_type": "oven", "make": "GE", "model": "JB655", "location": "kitchen"}]
-        mock_context.state = {"appliance_inventory": list(existing)}
+        tool_context.state["appliance_inventory"] = list(existing)
 
         result = log_appliance(
             appliance_type="dishwasher",
@@ -49,21 +43,18 @@ class TestLogAppliance:
             model="SHPM88Z75N",
             location="kitchen",
             finish="black",
-            tool_context=mock_context,
+            tool_context=tool_context,
         )
 
         assert result["status"] == "success"
-        assert len(mock_context.state["appliance_inventory"]) == 2
-        assert mock_context.state["appliance_inventory"][0]["appliance_type"] == "oven"
-        assert mock_context.state["appliance_inventory"][1]["appliance_type"] == "dishwasher"
+        assert len(tool_context.state["appliance_inventory"]) == 2
+        assert tool_context.state["appliance_inventory"][0]["appliance_type"] == "oven"
+        assert tool_context.state["appliance_inventory"][1]["appliance_type"] == "dishwasher"
 
-    def test_log_appliance_with_optional_notes(self):
+    def test_log_appliance_with_optional_notes(self, tool_context):
         """Notes field is included when provided."""
         from app.home_agent.tools import log_appliance
 
-        mock_context = MagicMock()
-        mock_context.state = {}
-
         result = log_appliance(
             appliance_type="washing machine",
             make="LG",
@@ -71,42 +62,38 @@ class TestLogAppliance:
             location="laundry room",
             finish="white",
             notes="Front loader, purchased 2024",
-            tool_context=mock_context,
+            tool_context=tool_context,
         )
 
         assert result["status"] == "success"
-        entry = mock_context.state["appliance_inventory"][0]
+        entry = tool_context.state["appliance_inventory"][0]
         assert entry["notes"] == "Front loader, purchased 2024"
 
-    def test_log_appliance_without_optional_notes(self):
+    def test_log_appliance_without_optional_notes(self, tool_context):
         """Notes field defaults to empty string when not provided."""
         from app.home_agent.tools import log_appliance
 
-        mock_context = MagicMock()
-        mock_context.state = {}
-
         result = log_appliance(
             appliance_type="microwave",
             make="Panasonic",
             model="NN-SN66KB",
             location="kitchen",
             finish="black",
-            tool_context=mock_context,
+            tool_context=tool_context,
         )
 
-        entry = mock_context.state["appliance_inventory"][0]
+        entry = tool_context.state["appliance_inventory"][0]
         assert entry["notes"] == ""
 
-    def test_log_appliance_returns_current_count(self):
+    def test_log_appliance_returns_current_count(self, tool_context):
         """Result includes the total inventory count."""
         from app.home_agent.tools import log_appliance
 
-        mock_context = MagicMock()
         existing = [
             {"appliance_type": "oven", "make": "GE", "model": "JB655", "location": "kitchen"},
             {"appliance_type": "fridge", "make": "LG", "model": "LRMVS3006S", "location": "kitchen"},
         ]
-        mock_context.state = {"appliance_inventory": list(existing)}
+        tool_context.state["appliance_inventory"] = list(existing)
 
         result = log_appliance(
             appliance_type="dryer",
@@ -114,7 +101,81 @@ class TestLogAppliance:
             model="DVE45R6100W",
             location="laundry room",
             finish="white",
-            tool_context=mock_context,
+            tool_context=tool_context,
         )
 
         assert result["total_appliances"] == 3
+
+    def test_log_appliance_skips_duplicate(self, tool_context):
+        """Logging the same appliance twice returns duplicate without appending."""
+        from app.home_agent.tools import log_appliance
+
+        kwargs = {
+            "appliance_type": "refrigerator",
+            "make": "Samsung",
+            "model": "RF28R7351SR",
+            "location": "kitchen",
+            "finish": "stainless steel",
+            "tool_context": tool_context,
+        }
+
+        log_appliance(**kwargs)
+        result = log_appliance(**{**kwargs, "make": "samsung", "model": "rf28r7351sr"})
+
+        assert result["status"] == "duplicate"
+        assert result["total_appliances"] == 1
+        assert len(tool_context.state["appliance_inventory"]) == 1
+
+
+class TestInventory:
+    """Tests for the session inventory dedup index and size cap."""
+
+    @staticmethod
+    def _entry(model):
+        return {
+            "appliance_type": "oven",
+            "make": "GE",
+            "model": model,
+            "location": "kitchen",
+        }
+
+    def test_cap_drops_oldest_and_rebuilds_index(self, monkeypatch):
+        """Past the cap the oldest entry is dropped and the index is rebuilt."""
+        from app.home_agent import inventory
+
+        monkeypatch.setattr(inventory, "MAX_INVENTORY_SIZE", 3)
+        state = {}
+        for model in ("A1", "A2", "A3", "A4"):
+            _, added = inventory.add_to_inventory(state, self._entry(model))
+            assert added
+
+        items = state[inventory.INVENTORY_KEY]
+        assert [e["model"] for e in items] == ["A2", "A3", "A4"]
+
+        # A surviving entry is still flagged as a duplicate by the rebuilt index.
+        _, added = inventory.add_to_inventory(state, self._entry("a3"))
+        assert not added
+
+        # The dropped entry can be logged again.
+        _, added = inventory.add_to_inventory(state, self._entry("A1"))
+        assert added
+        items = state[inventory.INVENTORY_KEY]
+        assert [e["model"] for e in items] == ["A3", "A4", "A1"]
+        assert state[inventory.INDEX_KEY] == {
+            inventory._inventory_key(e): i for i, e in enumerate(items)
+        }
+
+    def test_missing_index_is_rebuilt_from_list(self):
+        """State holding only the inventory list (e.g. resumed) rebuilds the index."""
+        from app.home_agent import inventory
+
+        state = {inventory.INVENTORY_KEY: [self._entry("A1"), self._entry("A2")]}
+
+        _, added = inventory.add_to_inventory(state, self._entry("A2"))
+        assert not added
+        assert len(state[inventory.INVENTORY_KEY]) == 2
+
+        items, added = inventory.add_to_inventory(state, self._entry("A3"))
+        assert added
+        assert [e["model"] for e in items] == ["A1", "A2", "A3"]
+        assert inventory._inventory_key(self._entry("A3")) in state[inventory.INDEX_KEY]
@@ -6,29 +6,31 @@ from unittest.mock import MagicMock, patch
 
 import pytest
 
+TABLE_REF = "test-project.appliances_v2.inventory"
+
 
 class TestLogApplianceBQ:
     """Tests for the log_appliance_bq tool function."""
 
-    def _call_tool(self, mock_bq_client=None, **kwargs):
+    async def _call_tool(self, tool_context, mock_bq_client=None, **kwargs):
         """Helper to call log_appliance_bq with a mocked BQ client."""
         from app.home_agent.tools_bq import log_appliance_bq
 
-        mock_context = MagicMock()
-        mock_context.state = kwargs.pop("state", {})
-
         if mock_bq_client is None:
             mock_bq_client = MagicMock()
             mock_bq_client.insert_rows_json.return_value = []  # no errors
 
-        with patch("app.home_agent.tools_bq._get_bq_client", return_value=mock_bq_client):
-            result = log_appliance_bq(tool_context=mock_context, **kwargs)
+        with patch.multiple(
+            "app.home_agent.tools_bq", _bq_client=mock_bq_client, _table_ref=TABLE_REF
+        ):
+            result = await log_appliance_bq(tool_context=tool_context, **kwargs)
 
-        return result, mock_context, mock_bq_client
+        return result, mock_bq_client
 
-    def test_writes_to_session_state(self):
+    async def test_writes_to_session_state(self, tool_context):
         """Tool writes appliance entry to session state like the original tool."""
-        result, mock_context, _ = self._call_tool(
+        result, _ = await self._call_tool(
+            tool_context,
             appliance_type="refrigerator",
             make="Samsung",
             model="RF28R7351SR",
@@ -37,19 +39,20 @@ class TestLogApplianceBQ:
         )
 
         assert result["status"] == "success"
-        inventory = mock_context.state["appliance_inventory"]
+        inventory = tool_context.state["appliance_inventory"]
         assert len(inventory) == 1
         assert inventory[0]["appliance_type"] == "refrigerator"
         assert inventory[0]["make"] == "Samsung"
         assert inventory[0]["finish"] == "stainless steel"
         assert inventory[0]["user_id"] == "demo_user"
 
-    def test_calls_bigquery_insert(self):
+    async def test_calls_bigquery_insert(self, tool_context):
         """Tool calls BigQuery insert_rows_json with correct data."""
         mock_bq = MagicMock()
         mock_bq.insert_rows_json.return_value = []
 
-        result, _, mock_bq = self._call_tool(
+        result, mock_bq = await self._call_tool(
+            tool_context,
             mock_bq_client=mock_bq,
             appliance_type="oven",
             make="GE",
@@ -63,7 +66,7 @@ class TestLogApplianceBQ:
         table_ref = call_args[0][0]
         rows = call_args[0][1]
 
-        assert "appliances_v2.inventory" in table_ref
+        assert table_ref == TABLE_REF
         assert len(rows) == 1
         assert rows[0]["appliance_type"] == "oven"
         assert rows[0]["make"] == "GE"
@@ -72,9 +75,10 @@ class TestLogApplianceBQ:
         assert rows[0]["user_id"] == "demo_user"
         assert "timestamp" in rows[0]
 
-    def test_timestamp_is_utc_iso(self):
+    async def test_timestamp_is_utc_iso(self, tool_context):
         """Timestamp field is a valid UTC ISO-8601 string."""
-        result, mock_context, mock_bq = self._call_tool(
+        result, mock_bq = await self._call_tool(
+            tool_context,
             appliance_type="dishwasher",
             make="Bosch",
             model="SHPM88Z75N",
@@ -87,12 +91,13 @@ class TestLogApplianceBQ:
         ts = datetime.fromisoformat(row["timestamp"])
         assert ts.tzinfo is not None  # timezone-aware
 
-    def test_bigquery_error_returns_error_status(self):
+    async def test_bigquery_error_returns_error_status(self, tool_context):
         """If BigQuery insert fails, result includes error but does not raise."""
         mock_bq = MagicMock()
         mock_bq.insert_rows_json.return_value = [{"index": 0, "errors": ["some error"]}]
 
-        result, mock_context, _ = self._call_tool(
+        result, _ = await self._call_tool(
+            tool_context,
             mock_bq_client=mock_bq,
             appliance_type="microwave",
             make="Panasonic",
@@ -104,11 +109,12 @@ class TestLogApplianceBQ:
         assert result["status"] == "error"
         assert "bigquery_errors" in result
         # Session state should still be written even if BQ fails
-        assert len(mock_context.state["appliance_inventory"]) == 1
+        assert len(tool_context.state["appliance_inventory"]) == 1
 
-    def test_optional_notes_default(self):
+    async def test_optional_notes_default(self, tool_context):
         """Notes defaults to empty string when not provided."""
-        result, mock_context, mock_bq = self._call_tool(
+        result, mock_bq = await self._call_tool(
+            tool_context,
             appliance_type="dryer",
             make="Samsung",
             model="DVE45R6100W",
@@ -118,11 +124,12 @@ class TestLogApplianceBQ:
 
         row = mock_bq.insert_rows_json.call_args[0][1][0]
         assert row["notes"] == ""
-        assert mock_context.state["appliance_inventory"][0]["notes"] == ""
+        assert tool_context.state["appliance_inventory"][0]["notes"] == ""
 
-    def test_custom_user_id(self):
+    async def test_custom_user_id(self, tool_context):
         """User ID can be overridden from the default."""
-        result, mock_context, mock_bq = self._call_tool(
+        result, mock_bq = await self._call_tool(
+            tool_context,
             appliance_type="washer",
             make="LG",
             model="WM4000HWA",
@@ -133,14 +140,15 @@ class TestLogApplianceBQ:
 
         row = mock_bq.insert_rows_json.call_args[0][1][0]
         assert row["user_id"] == "custom_user_123"
-        assert mock_context.state["appliance_inventory"][0]["user_id"] == "custom_user_123"
+        assert tool_context.state["appliance_inventory"][0]["user_id"] == "custom_user_123"
 
-    def test_appends_to_existing_inventory(self):
+    async def test_appends_to_existing_inventory(self, tool_context):
         """New entries append to existing session state inventory."""
         existing = [{"appliance_type": "oven", "make": "GE", "model": "JB655", "location": "kitchen"}]
+        tool_context.state["appliance_inventory"] = list(existing)
 
-        result, mock_context, _ = self._call_tool(
-            state={"appliance_inventory": list(existing)},
+        result, _ = await self._call_tool(
+            tool_context,
             appliance_type="fridge",
             make="LG",
             model="LRMVS3006S",
@@ -149,5 +157,125 @@ class TestLogApplianceBQ:
         )
 
         assert result["total_appliances"] == 2
-        assert mock_context.state["appliance_inventory"][0]["appliance_type"] == "oven"
-        assert mock_context.state["appliance_inventory"][1]["appliance_type"] == "fridge"
+        assert tool_context.state["appliance_inventory"][0]["appliance_type"] == "oven"
+        assert tool_context.state["appliance_inventory"][1]["appliance_type"] == "fridge"
+
+    async def test_duplicate_skips_bigquery_insert(self, tool_context):
+        """An appliance already in the session inventory is not re-inserted."""
+        existing = [{"appliance_type": "oven", "make": "GE", "model": "JB655", "location": "kitchen"}]
+        tool_context.state["appliance_inventory"] = list(existing)
+
+        result, mock_bq = await self._call_tool(
+            tool_context,
+            appliance_type="oven",
+            make="GE",
+            model="JB655",
+            location="Kitchen",
+            finish="black",
+        )
+
+        assert result["status"] == "duplicate"
+        assert len(tool_context.state["appliance_inventory"]) == 1
+        mock_bq.insert_rows_json.assert_not_called()
+
+
+class TestBigQueryBackgroundWriter:
+    """Tests for the batched background BigQuery writer."""
+
+    async def test_queued_rows_are_batched_into_one_insert(self, tool_context):
+        """With the writer running, rows are queued and inserted together."""
+        from app.home_agent import tools_bq
+
+        mock_bq = MagicMock()
+        mock_bq.insert_rows_json.return_value = []
+
+        with patch.multiple(
+            "app.home_agent.tools_bq", _bq_client=mock_bq, _table_ref=TABLE_REF
+        ):
+            tools_bq.start_bq_writer()
+            try:
+                for appliance_type in ("oven", "dishwasher"):
+                    result = await tools_bq.log_appliance_bq(
+                        appliance_type=appliance_type,
+                        make="GE",
+                        model="unknown",
+                        location="kitchen",
+                        finish="black",
+                        tool_context=tool_context,
+                    )
+                    assert result["status"] == "success"
+                mock_bq.insert_rows_json.assert_not_called()
+            finally:
+                await tools_bq.stop_bq_writer()
+
+        mock_bq.insert_rows_json.assert_called_once()
+        rows = mock_bq.insert_rows_json.call_args[0][1]
+        assert [r["appliance_type"] for r in rows] == ["oven", "dishwasher"]
+
+    async def test_failed_writer_falls_back_to_direct_insert(self, tool_context):
+        """If the writer task dies, the tool stops queueing and inserts directly."""
+        import asyncio
+
+        from app.home_agent import tools_bq
+
+        async def broken_writer(queue):
+            raise RuntimeError("writer crashed")
+
+        mock_bq = MagicMock()
+        mock_bq.insert_rows_json.return_value = []
+
+        with patch.multiple(
+            "app.home_agent.tools_bq",
+            _bq_client=mock_bq,
+            _table_ref=TABLE_REF,
+            _run_bq_writer=broken_writer,
+        ):
+            tools_bq.start_bq_writer()
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            assert tools_bq._row_queue is None
+            assert tools_bq._writer_task is None
+
+            result = await tools_bq.log_appliance_bq(
+                appliance_type="oven",
+                make="GE",
+                model="unknown",
+                location="kitchen",
+                finish="black",
+                tool_context=tool_context,
+            )
+
+        assert result["status"] == "success"
+        mock_bq.insert_rows_json.assert_called_once()
+
+    async def test_client_created_off_the_event_loop(self, tool_context):
+        """The BigQuery client and its credential lookup are built off the loop."""
+        import threading
+
+        from app.home_agent import tools_bq
+
+        created_on = []
+
+        def fake_client(**kwargs):
+            created_on.append(threading.current_thread())
+            client = MagicMock(project="test-project")
+            client.insert_rows_json.return_value = []
+            return client
+
+        with (
+            patch.multiple("app.home_agent.tools_bq", _bq_client=None, _table_ref=None),
+            patch("app.home_agent.tools_bq.bigquery.Client", side_effect=fake_client),
+        ):
+            result = await tools_bq.log_appliance_bq(
+                appliance_type="oven",
+                make="GE",
+                model="unknown",
+                location="kitchen",
+                finish="black",
+                tool_context=tool_context,
+            )
+            table_ref = tools_bq._table_ref
+
+        assert result["status"] == "success"
+        assert created_on and created_on[0] is not threading.main_thread()
+        assert table_ref == TABLE_REF